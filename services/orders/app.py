@@ -1,38 +1,171 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, current_app
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import BadRequest, HTTPException
+import orjson
 import logging
-from datetime import datetime
-import os
-import sys
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import atexit
+import time
+from functools import lru_cache
 from config import get_config
-from features.analytics_service import AnalyticsService
+from cache import ResultCache
 
-# Initialize analytics service
-analytics = AnalyticsService()
+# Analytics service: built once per process; lazily on the first request under
+# `python app.py`, and in the master before forking under gunicorn (when_ready)
+@lru_cache(maxsize=1)
+def get_analytics():
+    """Create the analytics service on first use (defers pandas/numpy imports; sklearn loads on first training)"""
+    from features.analytics_service import AnalyticsService
+    return AnalyticsService(
+        job_folder=config.TRAINING_JOB_FOLDER,
+        job_ttl=config.TRAINING_JOB_TTL,
+        max_jobs=config.TRAINING_JOB_MAX,
+        training_workers=config.TRAINING_WORKERS
+    )
 
 # Get configuration
 config = get_config()
 
+# Cache for idempotent analytics results
+result_cache = ResultCache(
+    maxsize=config.RESULT_CACHE_SIZE,
+    ttl=config.RESULT_CACHE_TTL,
+    maxbytes=config.RESULT_CACHE_MAX_BYTES,
+    maxentry=config.RESULT_CACHE_MAX_ENTRY_BYTES
+)
+
 # Configure logging for production
+@lru_cache(maxsize=None)
 def configure_logging():
-    """Configure production logging"""
-    logging.basicConfig(
-        level=config.LOG_LEVEL,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler('app.log')
-        ]
-    )
+    """Configure production logging (runs once per process)
+
+    Request threads only enqueue records; a background QueueListener does the
+    formatting and stream/file I/O, so handlers never contend on the file lock.
+    """
+    formatter = logging.Formatter(config.LOG_FORMAT)
+    handlers = [logging.StreamHandler(), logging.FileHandler('app.log')]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    # Records are formatted once, by the listener's handlers
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
+    # force: replace a QueueHandler inherited from a forked parent
+    logging.basicConfig(level=config.LOG_LEVEL, handlers=[queue_handler], force=True)
+    return listener
+
+def reset_logging_after_fork():
+    """Build a fresh queue and listener in a forked worker
+
+    The inherited listener has no thread in the child, and its queue may hold
+    records the parent has yet to emit; both are dropped rather than reused.
+    """
+    inherited = configure_logging()
+    atexit.unregister(inherited.stop)
+    for handler in inherited.handlers:
+        handler.close()
+    configure_logging.cache_clear()
+    return configure_logging()
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson (handles numpy and datetime natively)"""
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        option = self.option
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """Build the response from orjson bytes, skipping the str round-trip"""
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self.option | orjson.OPT_APPEND_NEWLINE
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=option), mimetype=self.mimetype
+        )
+
+def get_json_body():
+    """Parse the request body with orjson without caching the raw bytes
+
+    Returns the payload and a digest of the raw body for the result cache.
+    """
+    body = request.get_data(cache=False)
+    if not body:
+        return None, None
+    try:
+        return orjson.loads(body), ResultCache.digest(body)
+    except orjson.JSONDecodeError:
+        raise BadRequest('Invalid JSON body')
+
+def cached_response(namespace, compute):
+    """Serve a successful result's encoded body from the cache, or compute, encode and store it
+
+    Hits skip both the analytics work and the JSON encoding.
+    """
+    key = (namespace, g.payload_digest)
+    body = result_cache.get(key)
+    if body is not None:
+        return current_app.response_class(body, mimetype=current_app.json.mimetype)
+
+    result = compute()
+    response = jsonify(result)
+    if result.get('status') == 'success':
+        result_cache.set(key, response.get_data())
+    return response
 
 def create_app():
     """Application Factory Pattern"""
     app = Flask(__name__)
     app.config.from_object(config)
+    app.json = OrjsonProvider(app)
     
     # Configure logging
     configure_logging()
     logger = logging.getLogger(__name__)
     
+    @app.before_request
+    def start_request_timer():
+        """Stamp the request start with the monotonic clock"""
+        g.request_start = time.perf_counter()
+    
+    @app.before_request
+    def load_json_payload():
+        """Read and parse the request body once, before dispatch"""
+        g.payload, g.payload_digest = get_json_body() if request.method == 'POST' else (None, None)
+    
+    @app.after_request
+    def record_request_metrics(response):
+        """Track request count, errors and latency per route"""
+        rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+        get_analytics().track_request(
+            rule, request.method, response.status_code, time.perf_counter() - g.request_start
+        )
+        return response
+    
+    @app.errorhandler(HTTPException)
+    def handle_http_exception(e):
+        """Return HTTP errors (bad JSON, 404, 405) without touching the body"""
+        response = jsonify({'status': 'error', 'message': e.description})
+        response.status_code = e.code
+        # Keep headers set by the exception (e.g. Allow on 405), but not its HTML Content-Type
+        for name, value in e.get_headers():
+            if name.lower() != 'content-type':
+                response.headers[name] = value
+        return response
+    
     @app.errorhandler(Exception)
     def handle_exception(e):
         """Global error handler"""
@@ -43,91 +176,93 @@ def create_app():
     @app.route('/health')
     def health_check():
         """Health check endpoint for monitoring"""
-        return jsonify(analytics.get_health_status())
+        return jsonify(get_analytics().get_health_status())
     
     # Metrics Endpoint
     @app.route('/metrics')
     def get_metrics():
         """Performance metrics endpoint"""
-        return jsonify(analytics.get_metrics())
+        return jsonify(get_analytics().get_metrics())
     
     # === DATA PROCESSING ENDPOINTS ===
     
     @app.route('/api/data/process', methods=['POST'])
     def process_data():
         """Process uploaded data"""
-        try:
-            data = request.get_json()
-            if not data:
-                return jsonify({'status': 'error', 'message': 'No data provided'}), 400
-                
-            result = analytics.process_data(data)
-            return jsonify(result)
-        except Exception as e:
-            return jsonify({'status': 'error', 'message': str(e)}), 500
+        data = g.payload
+        if not data:
+            return jsonify({'status': 'error', 'message': 'No data provided'}), 400
+            
+        return cached_response('process', lambda: get_analytics().process_data(data))
     
     @app.route('/api/data/validate', methods=['POST'])
     def validate_data():
         """Validate data quality"""
-        try:
-            data = request.get_json()
-            if not data:
-                return jsonify({'status': 'error', 'message': 'No data provided'}), 400
-                
-            result = analytics.validate_data(data)
-            return jsonify(result)
-        except Exception as e:
-            return jsonify({'status': 'error', 'message': str(e)}), 500
+        data = g.payload
+        if not data:
+            return jsonify({'status': 'error', 'message': 'No data provided'}), 400
+            
+        return cached_response('validate', lambda: get_analytics().validate_data(data))
     
     # === ANALYSIS ENDPOINTS ===
     
     @app.route('/api/analysis/stats', methods=['POST'])
     def statistical_analysis():
         """Perform statistical analysis"""
-        try:
-            data = request.get_json()
-            if not data:
-                return jsonify({'status': 'error', 'message': 'No data provided'}), 400
-                
-            result = analytics.analyze_data(data)
-            return jsonify(result)
-        except Exception as e:
-            return jsonify({'status': 'error', 'message': str(e)}), 500
+        data = g.payload
+        if not data:
+            return jsonify({'status': 'error', 'message': 'No data provided'}), 400
+            
+        return cached_response('stats', lambda: get_analytics().analyze_data(data))
     
     # === MACHINE LEARNING ENDPOINTS ===
     
     @app.route('/api/ml/train', methods=['POST'])
     def train_model():
         """Train ML model"""
-        try:
-            data = request.get_json()
-            if not data or 'target' not in data:
-                return jsonify({'status': 'error', 'message': 'Data and target column required'}), 400
-                
-            target_column = data.pop('target')
-            result = analytics.train_model(data, target_column)
-            return jsonify(result)
-        except Exception as e:
-            return jsonify({'status': 'error', 'message': str(e)}), 500
+        data = g.payload
+        if not data or 'target' not in data:
+            return jsonify({'status': 'error', 'message': 'Data and target column required'}), 400
+            
+        target_column = data.pop('target')
+        result = get_analytics().train_model(data, target_column)
+        return jsonify(result)
+    
+    @app.route('/api/ml/train/async', methods=['POST'])
+    def submit_training():
+        """Queue ML model training and return a job id"""
+        data = g.payload
+        if not data or 'target' not in data:
+            return jsonify({'status': 'error', 'message': 'Data and target column required'}), 400
+        
+        target_column = data.pop('target')
+        job_id = get_analytics().submit_training(data, target_column)
+        return jsonify({'status': 'accepted', 'job_id': job_id}), 202
+    
+    @app.route('/api/ml/jobs/<job_id>', methods=['GET'])
+    def training_result(job_id):
+        """Poll a queued training job"""
+        result = get_analytics().get_training_result(job_id)
+        if result is None:
+            return jsonify({'status': 'error', 'message': 'Unknown job id'}), 404
+        return jsonify(result)
     
     # === VISUALIZATION ENDPOINTS ===
     
     @app.route('/api/viz/chart', methods=['POST'])
     def create_chart():
         """Create visualization chart"""
-        try:
-            data = request.get_json()
-            if not data:
-                return jsonify({'status': 'error', 'message': 'No data provided'}), 400
-                
-            chart_type = data.pop('chart_type', 'bar')
-            x_col = data.pop('x_column', None)
-            y_col = data.pop('y_column', None)
+        data = g.payload
+        if not data:
+            return jsonify({'status': 'error', 'message': 'No data provided'}), 400
             
-            result = analytics.create_chart(data, chart_type, x_col, y_col)
-            return jsonify(result)
-        except Exception as e:
-            return jsonify({'status': 'error', 'message': str(e)}), 500
+        chart_type = data.pop('chart_type', 'bar')
+        x_col = data.pop('x_column', None)
+        y_col = data.pop('y_column', None)
+        
+        return cached_response(
+            'chart', lambda: get_analytics().create_chart(data, chart_type, x_col, y_col)
+        )
     
     return app
 
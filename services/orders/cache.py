@@ -0,0 +1,112 @@
+"""In-process result cache for idempotent analytics endpoints"""
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class ResultCache:
+    """Thread-safe LRU cache of encoded response bodies with a per-entry TTL
+
+    Bounded by entry count and by total bytes; bodies larger than maxentry
+    are not cached at all so one wide result cannot flush the rest.
+    """
+
+    def __init__(self, maxsize=256, ttl=300, maxbytes=32 * 1024 * 1024, maxentry=2 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.maxentry = maxentry
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.lock = Lock()
+
+    @staticmethod
+    def digest(body):
+        """Content-address a raw request body"""
+        return hashlib.blake2b(body, digest_size=16).digest()
+
+    def get(self, key):
+        """Return a cached body, or None if missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, body = entry
+            if expires_at < time.monotonic():
+                self._discard(key)
+                return None
+
+            self.entries.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        """Store a body, evicting the least recently used entries"""
+        if len(body) > self.maxentry:
+            return
+        with self.lock:
+            self._discard(key)
+            self.entries[key] = (time.monotonic() + self.ttl, body)
+            self.nbytes += len(body)
+            while len(self.entries) > self.maxsize or self.nbytes > self.maxbytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def _discard(self, key):
+        """Drop an entry and its bytes (caller holds the lock)"""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= len(entry[1])
+
+
+class HealthCache:
+    """WSGI middleware that serves a GET path from a short-lived cached response"""
+
+    def __init__(self, app, path='/health', ttl=5):
+        self.app = app
+        self.path = path
+        self.ttl = ttl
+        self.entry = None  # (expires_at, status, headers, body)
+        self.lock = Lock()
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') != self.path or environ.get('REQUEST_METHOD') != 'GET':
+            return self.app(environ, start_response)
+
+        entry = self.entry
+        if entry is None or entry[0] < time.monotonic():
+            # One request renders while concurrent ones wait for its result
+            with self.lock:
+                entry = self.entry
+                if entry is None or entry[0] < time.monotonic():
+                    entry = self.render(environ)
+
+        _, status, headers, body = entry
+        start_response(status, headers)
+        return [body]
+
+    def render(self, environ):
+        """Run the wrapped app once and cache the response if it succeeded"""
+        captured = {}
+        chunks = []
+
+        def capture(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            return chunks.append
+
+        result = self.app(environ, capture)
+        try:
+            chunks.extend(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+        status = captured['status']
+        headers = list(captured['headers'])
+        entry = (time.monotonic() + self.ttl, status, headers, b''.join(chunks))
+        if status.startswith('200'):
+            headers.append(('Cache-Control', f'max-age={self.ttl}'))
+            self.entry = entry
+        return entry
@@ -1,6 +1,8 @@
 # Configuration file for Data Analytics Microservice
 import os
-from typing import Dict, Any
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping, Any
 
 class Config:
     """Base configuration class"""
@@ -63,15 +65,29 @@ class Config:
     
     # Redis Configuration (if needed for caching)
     REDIS_URL = os.getenv('REDIS_URL')
+
+    # Result Cache Configuration (in-process, per worker)
+    RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 256))
+    RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', 300))
+    RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 32 * 1024 * 1024))  # encoded bodies, per worker
+    RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv('RESULT_CACHE_MAX_ENTRY_BYTES', 2 * 1024 * 1024))  # larger bodies are not cached
+    HEALTH_CACHE_TTL = int(os.getenv('HEALTH_CACHE_TTL', 5))  # seconds; /health counters lag by at most this
+
+    # Background Training Jobs (state shared by all workers through TRAINING_JOB_FOLDER)
+    TRAINING_WORKERS = int(os.getenv('TRAINING_WORKERS', 1))  # training processes per gunicorn worker
+    TRAINING_JOB_FOLDER = os.getenv('TRAINING_JOB_FOLDER', 'jobs')
+    TRAINING_JOB_TTL = int(os.getenv('TRAINING_JOB_TTL', 3600))  # seconds
+    TRAINING_JOB_MAX = int(os.getenv('TRAINING_JOB_MAX', 100))
     
     @classmethod
-    def get_config(cls) -> Dict[str, Any]:
-        """Get all configuration as dictionary"""
-        return {
+    @lru_cache(maxsize=None)
+    def get_config(cls) -> Mapping[str, Any]:
+        """Get all configuration as a read-only mapping (built once per class)"""
+        return MappingProxyType({
             key: getattr(cls, key)
             for key in dir(cls)
             if not key.startswith('_') and not callable(getattr(cls, key))
-        }
+        })
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -0,0 +1 @@
+"""pytest root: makes the service modules (app, features) importable from tests/"""
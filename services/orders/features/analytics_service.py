@@ -3,118 +3,411 @@ Unified Analytics Service - รวมทุก features ใน file เดีย
 """
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score
+import orjson
+import logging
+import math
+import multiprocessing
+import os
 import time
-from collections import defaultdict, deque
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from functools import partial
 from threading import Lock
-import json
+import warnings
+
+logger = logging.getLogger(__name__)
+
+# ลำดับสถิติที่ analyze_data คืนค่าให้แต่ละคอลัมน์
+STAT_NAMES = ('mean', 'median', 'std', 'min', 'max')
+
+# ชนิด input ที่ทุก method รับได้ (ตรวจก่อนเข้า try เพื่อ fail fast)
+SUPPORTED_INPUTS = (dict, list, pd.DataFrame, np.ndarray)
+
+# error จากข้อมูลของผู้ใช้ (คอลัมน์ไม่มี, ชนิดข้อมูลผิด, ข้อมูลว่าง) ที่คืนเป็น error response
+# error อื่นถือเป็น bug และส่งต่อให้ endpoint log พร้อม traceback
+DATA_ERRORS = (KeyError, ValueError, TypeError, ArithmeticError)
+
+# จำนวน response time ล่าสุดที่เก็บต่อ endpoint
+RESPONSE_TIME_WINDOW = 100
+
+# จำนวน feature importance สูงสุดที่ train_model ส่งกลับ
+TOP_FEATURES = 20
+
+# จำนวน shard ของ metrics แต่ละ shard มี dict และ lock ของตัวเอง (ต้องเป็นกำลังของ 2)
+METRIC_SHARDS = 16
+
+class EndpointMetric:
+    """metric ของ endpoint หนึ่ง (__slots__: ไม่มี __dict__ ต่อ instance, อ่าน/เขียน field เป็น slot)"""
+    __slots__ = ('count', 'total_time', 'errors', 'last_access_ns', 'rt_buf', 'rt_head')
+    
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.errors = 0
+        self.last_access_ns = 0  # time.time_ns() ของ request ล่าสุด (0 = ยังไม่มี)
+        self.rt_buf = np.zeros(RESPONSE_TIME_WINDOW, dtype=np.float32)  # ring buffer ของ response time ล่าสุด
+        self.rt_head = 0
+
+class TrainingJobStore:
+    """สถานะ/ผลของงาน train เก็บเป็นไฟล์ JSON ละหนึ่ง job ในโฟลเดอร์เดียวกัน
+    
+    ทุก gunicorn worker และ process ที่ train อ่าน/เขียนโฟลเดอร์นี้ จึง poll จาก worker ไหนก็ได้
+    (หลาย instance ต้อง mount โฟลเดอร์เดียวกัน) ไฟล์เก่ากว่า ttl วินาทีถือว่าหมดอายุ และเก็บไม่เกิน max_jobs ไฟล์
+    """
+    
+    def __init__(self, folder, ttl=3600, max_jobs=100):
+        self.folder = folder
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+    
+    def _path(self, job_id):
+        return os.path.join(self.folder, f'{job_id}.json')
+    
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # worker อื่นลบไปแล้ว
+    
+    @staticmethod
+    def valid_id(job_id):
+        """job_id ต้องเป็น uuid4 hex (กัน path traversal จาก URL)"""
+        try:
+            return uuid.UUID(hex=job_id).hex == job_id
+        except ValueError:
+            return False
+    
+    def write(self, job_id, record):
+        """เขียนแบบ atomic (ไฟล์ชั่วคราว + os.replace) ผู้อ่านไม่เห็นไฟล์ที่เขียนไม่เสร็จ"""
+        path = self._path(job_id)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS))
+        os.replace(tmp_path, path)
+    
+    def read(self, job_id):
+        """record ของ job (None ถ้าไม่รู้จักหรือหมดอายุ)"""
+        if not self.valid_id(job_id):
+            return None
+        path = self._path(job_id)
+        try:
+            if time.time() - os.stat(path).st_mtime > self.ttl:
+                return None
+            with open(path, 'rb') as f:
+                return orjson.loads(f.read())
+        except FileNotFoundError:
+            return None
+    
+    def discard(self, job_id):
+        self._remove(self._path(job_id))
+    
+    def evict(self):
+        """ลบไฟล์ที่หมดอายุ แล้วลบไฟล์เก่าสุดจนเหลือที่ว่างให้ job ใหม่"""
+        os.makedirs(self.folder, exist_ok=True)
+        now = time.time()
+        live = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if now - mtime > self.ttl:
+                    self._remove(entry.path)
+                elif entry.name.endswith('.json'):
+                    live.append((mtime, entry.path))
+        
+        live.sort()
+        for _, path in live[:max(0, len(live) - self.max_jobs + 1)]:
+            self._remove(path)
+
+def _train_model_job(data, target_column, store, job_id):
+    """งาน train ที่รันใน process pool (ระดับ module เพื่อให้ pickle ได้) เขียนผลลง store เอง"""
+    try:
+        # pool มีขนาดเล็กตายตัวอยู่แล้ว แต่ละงานจึงใช้ core เดียวเลี่ยง oversubscription
+        result = AnalyticsService().train_model(data, target_column, n_jobs=1)
+    except Exception:
+        logger.exception("Training job %s failed", job_id)
+        result = {'status': 'error', 'message': 'Internal server error'}
+    store.write(job_id, dict(result, job_id=job_id))
 
 class AnalyticsService:
     """Unified service ที่รวมทุก feature"""
     
-    def __init__(self):
-        # Metrics tracking
-        self.metrics = defaultdict(lambda: {
-            'count': 0,
-            'total_time': 0,
-            'errors': 0,
-            'last_access': None,
-            'response_times': deque(maxlen=100)
-        })
-        self.lock = Lock()
+    def __init__(self, job_folder='jobs', job_ttl=3600, max_jobs=100, training_workers=1):
+        # Metrics tracking: แบ่ง endpoint เป็น shard ตาม hash ของ key
+        # endpoint ต่าง shard ไม่แย่ง lock กัน และ dict แต่ละ shard เล็ก resize ถูก
+        self.metric_shards = [defaultdict(EndpointMetric) for _ in range(METRIC_SHARDS)]
+        self.locks = [Lock() for _ in range(METRIC_SHARDS)]
+        # ยอดรวม [requests, errors] ต่อ shard อัปเดตพร้อม metric ทำให้ health ไม่ต้องวนทุก endpoint
+        self.shard_totals = [[0, 0] for _ in range(METRIC_SHARDS)]
+        # ผล get_metrics ต่อ endpoint: key -> (count ตอนคำนวณ, entry) ใช้ count เป็น version
+        self._metrics_cache = {}
         self.start_time = datetime.now()
+        
+        # Background training jobs: สถานะอยู่ใน store ที่ทุก worker เห็น
+        # pool สร้างเมื่อมีงานแรกภายใน worker process ขนาดคงที่ไม่ขึ้นกับจำนวน core
+        self._jobs = TrainingJobStore(job_folder, ttl=job_ttl, max_jobs=max_jobs)
+        self._pool = None
+        self._pool_size = training_workers
+        self._futures = {}  # job_id -> Future ของงานที่ส่งจาก process นี้ (ใช้ตอน shutdown)
+        self._jobs_lock = Lock()
+    
+    @staticmethod
+    def _as_df(data):
+        """แปลง input เป็น DataFrame (DataFrame เดิมส่งผ่านได้เลย ndarray ห่อแบบไม่ copy)"""
+        if isinstance(data, (dict, list)):
+            return pd.DataFrame(data)
+        if isinstance(data, np.ndarray):
+            return pd.DataFrame(data, copy=False)
+        return data
+    
+    @staticmethod
+    def _numeric_columns(df):
+        """ชื่อคอลัมน์ตัวเลข (เหมือน select_dtypes(include=[np.number]) แต่ไม่สร้าง sub-frame)"""
+        return [
+            col for col, dtype in df.dtypes.items()
+            if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+        ]
+    
+    @staticmethod
+    def _unsupported_input(data):
+        """error response สำหรับ input ที่แปลงเป็น DataFrame ไม่ได้"""
+        return {'status': 'error', 'message': f'Unsupported data type: {type(data).__name__}'}
     
     # === DATA PROCESSING ===
     def process_data(self, data):
         """ประมวลผลข้อมูลพื้นฐาน"""
+        if not isinstance(data, SUPPORTED_INPUTS + (str,)):
+            return self._unsupported_input(data)
         try:
-            if isinstance(data, dict):
-                df = pd.DataFrame(data)
-            elif isinstance(data, list):
-                df = pd.DataFrame(data)
-            else:
-                df = pd.read_csv(data) if isinstance(data, str) else data
+            df = pd.read_csv(data) if isinstance(data, str) else self._as_df(data)
             
-            # Basic cleaning
-            df = df.dropna()
-            df = df.drop_duplicates()
+            # Basic cleaning: ตัดแถวที่มี NaN และแถวซ้ำด้วย mask เดียว แล้ว slice ครั้งเดียว
+            na_mask = df.isna().to_numpy().any(axis=1)
+            dup_mask = df.duplicated().to_numpy()
+            df = df.loc[~(na_mask | dup_mask)]
             
             return {
                 'status': 'success',
                 'shape': df.shape,
                 'columns': df.columns.tolist(),
-                'dtypes': df.dtypes.to_dict(),
-                'sample': df.head().to_dict('records')
+                'dtypes': df.dtypes.astype(str).to_dict(),
+                # sample เป็น list ของแถว เรียงตาม 'columns' (dtype=object คงชนิดของแต่ละคอลัมน์ไว้)
+                'sample': df.head().to_numpy(dtype=object).tolist()
             }
-        except Exception as e:
+        except DATA_ERRORS + (OSError,) as e:
             return {'status': 'error', 'message': str(e)}
     
     # === STATISTICAL ANALYSIS ===
     def analyze_data(self, data):
         """วิเคราะห์เชิงสถิติ"""
+        if not isinstance(data, SUPPORTED_INPUTS):
+            return self._unsupported_input(data)
         try:
-            df = pd.DataFrame(data) if isinstance(data, (dict, list)) else data
-            numeric_cols = df.select_dtypes(include=[np.number]).columns
-            
-            stats = {}
-            for col in numeric_cols:
-                stats[col] = {
-                    'mean': float(df[col].mean()),
-                    'median': float(df[col].median()),
-                    'std': float(df[col].std()),
-                    'min': float(df[col].min()),
-                    'max': float(df[col].max())
-                }
+            df = self._as_df(data)
+            numeric_cols = self._numeric_columns(df)
+            values = df[numeric_cols].to_numpy(dtype=np.float64)
+            
+            # คำนวณทุกคอลัมน์พร้อมกันด้วย reduction ตาม axis=0 (ข้าม NaN เหมือน pandas)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # คอลัมน์ที่เป็น NaN ทั้งหมดได้ NaN
+                if values.shape[0] == 0:
+                    # ไม่มีแถว: min/max ของ array ว่าง raise จึงคืน NaN ทุกสถิติเหมือน pandas
+                    summary = np.full((len(STAT_NAMES), values.shape[1]), np.nan)
+                elif np.isnan(values).any():
+                    summary = np.vstack([
+                        np.nanmean(values, axis=0), np.nanmedian(values, axis=0),
+                        np.nanstd(values, axis=0, ddof=1),
+                        np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+                    ])
+                else:
+                    summary = np.vstack([
+                        values.mean(axis=0), np.median(values, axis=0),
+                        values.std(axis=0, ddof=1),
+                        values.min(axis=0), values.max(axis=0)
+                    ])
+            
+            stats = {
+                col: dict(zip(STAT_NAMES, col_stats))
+                for col, col_stats in zip(numeric_cols, summary.T.tolist())
+            }
             
             return {
                 'status': 'success',
                 'descriptive_stats': stats,
-                'correlation': df[numeric_cols].corr().to_dict() if len(numeric_cols) > 1 else {}
+                'correlation': self._correlation_matrix(values, numeric_cols) if len(numeric_cols) > 1 else {}
             }
-        except Exception as e:
+        except DATA_ERRORS as e:
             return {'status': 'error', 'message': str(e)}
     
+    def _correlation_matrix(self, values, columns, decimals=None):
+        """Pearson correlation ด้วย np.corrcoef (BLAS) ครั้งเดียวแทน pandas corr()
+        
+        คืนเฉพาะสามเหลี่ยมบน (รวม diagonal) เป็น {col_i: {col_j: r}} สำหรับ j >= i
+        เพราะ matrix สมมาตร ครึ่งล่างหาได้จากการสลับ key
+        """
+        if values.shape[0] < 2:
+            # แถวเดียวหรือไม่มีแถว: corrcoef คืน scalar (ไม่สน rowvar) แต่ pandas ได้ NaN ทุกช่อง
+            matrix = np.full((len(columns), len(columns)), np.nan)
+        elif np.isnan(values).any():
+            # pandas ใช้ pairwise-complete observations เมื่อมี missing values
+            matrix = pd.DataFrame(values, columns=columns).corr().to_numpy()
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                matrix = np.corrcoef(values, rowvar=False)
+        if decimals is not None:
+            matrix = matrix.round(decimals)
+        
+        rows = matrix.tolist()
+        return {col: dict(zip(columns[i:], rows[i][i:])) for i, col in enumerate(columns)}
+    
     # === MACHINE LEARNING ===
-    def train_model(self, data, target_column):
-        """ฝึก ML model แบบง่าย"""
+    def train_model(self, data, target_column, n_jobs=-1):
+        """ฝึก ML model แบบง่าย (n_jobs=-1 ใช้ทุก CPU core ในการสร้าง trees)"""
+        # import sklearn เมื่อ train ครั้งแรกเท่านั้น endpoint อื่นไม่ต้องโหลด
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.metrics import accuracy_score
+        
+        if not isinstance(data, SUPPORTED_INPUTS):
+            return self._unsupported_input(data)
         try:
-            df = pd.DataFrame(data) if isinstance(data, (dict, list)) else data
+            df = self._as_df(data)
             
             # Prepare features and target
-            X = df.select_dtypes(include=[np.number]).drop(columns=[target_column], errors='ignore')
-            y = df[target_column]
+            feature_cols = pd.Index([col for col in self._numeric_columns(df) if col != target_column])
+            # tree ของ sklearn ทำงานบน float32 อยู่แล้ว แปลงครั้งเดียวเลี่ยง copy ใน fit/predict
+            X = df[feature_cols].to_numpy(dtype=np.float32)
+            y = df[target_column].to_numpy()
             
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+            # Split data (80/20): สุ่มลำดับ index ครั้งเดียวแล้ว index ทั้ง X และ y
+            n_test = math.ceil(len(X) * 0.2)
+            order = np.random.default_rng(42).permutation(len(X))
+            train_idx, test_idx = order[n_test:], order[:n_test]
+            X_train, X_test = X[train_idx], X[test_idx]
+            y_train, y_test = y[train_idx], y[test_idx]
             
             # Train model
-            model = RandomForestClassifier(n_estimators=10, random_state=42)  # Reduced for speed
+            model = RandomForestClassifier(n_estimators=10, random_state=42, n_jobs=n_jobs)  # Reduced for speed
             model.fit(X_train, y_train)
             
             # Evaluate
             predictions = model.predict(X_test)
             accuracy = accuracy_score(y_test, predictions)
             
+            # ส่งเฉพาะ top-K features: argpartition เลือกแบบ O(n) แล้ว sort แค่ K ตัว
+            importances = model.feature_importances_
+            top = np.arange(len(importances))
+            if len(importances) > TOP_FEATURES:
+                top = np.argpartition(importances, -TOP_FEATURES)[-TOP_FEATURES:]
+            top = top[np.argsort(-importances[top], kind='stable')]
+            
             return {
                 'status': 'success',
                 'accuracy': float(accuracy),
-                'feature_importance': dict(zip(X.columns, model.feature_importances_)),
+                'feature_importance': dict(zip(feature_cols[top].tolist(), importances[top].tolist())),
                 'model_type': 'RandomForest'
             }
-        except Exception as e:
+        except DATA_ERRORS as e:
             return {'status': 'error', 'message': str(e)}
     
+    def _new_pool(self):
+        # spawn: ไม่ fork process ที่มี thread ของ web server ทำงานอยู่
+        return ProcessPoolExecutor(
+            max_workers=self._pool_size,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    
+    def submit_training(self, data, target_column):
+        """ส่งงาน train เข้า process pool แล้วคืน job_id ทันที"""
+        job_id = uuid.uuid4().hex
+        self._jobs.evict()
+        # เขียน pending ก่อน submit เพื่อไม่ให้ทับผลของงานที่เสร็จเร็ว และลบทิ้งถ้า submit ไม่สำเร็จ
+        self._jobs.write(job_id, {'status': 'pending', 'job_id': job_id})
+        try:
+            with self._jobs_lock:
+                pool = self._pool = self._pool or self._new_pool()
+                try:
+                    future = pool.submit(_train_model_job, data, target_column, self._jobs, job_id)
+                except BrokenProcessPool:
+                    # process ลูกตาย (เช่นโดน OOM kill) pool เดิมใช้ต่อไม่ได้ สร้างใหม่แล้วส่งอีกครั้ง
+                    pool = self._pool = self._new_pool()
+                    future = pool.submit(_train_model_job, data, target_column, self._jobs, job_id)
+                self._futures[job_id] = future
+        except BaseException:
+            self._jobs.discard(job_id)
+            raise
+        future.add_done_callback(partial(self._training_done, job_id, pool))
+        return job_id
+    
+    def _training_done(self, job_id, pool, future):
+        """callback เมื่องานจบ: ผลปกติ job เขียนเอง ที่นี่บันทึกกรณี process ลูกตายหรือ pool พัง"""
+        self._futures.pop(job_id, None)
+        if future.cancelled():
+            return  # shutdown_training เขียนสถานะให้แล้ว
+        error = future.exception()
+        if error is None:
+            return
+        if isinstance(error, BrokenProcessPool):
+            # ให้ submit ครั้งถัดไปสร้าง pool ใหม่
+            with self._jobs_lock:
+                if self._pool is pool:
+                    self._pool = None
+        logger.error("Training job %s failed: %r", job_id, error)
+        self._jobs.write(job_id, {
+            'status': 'error', 'job_id': job_id,
+            'message': 'Training process terminated unexpectedly, please resubmit'
+        })
+    
+    def get_training_result(self, job_id):
+        """สถานะ/ผลของงาน train (None ถ้าไม่รู้จักหรือหมดอายุ) ผลที่เสร็จแล้วอยู่จนหมด ttl หรือถูก evict"""
+        return self._jobs.read(job_id)
+    
+    def shutdown_training(self):
+        """เรียกตอน worker ออก: ยกเลิกงานที่ยังไม่เริ่ม งานที่รันอยู่ train ต่อจนเสร็จและเขียนผลลง store"""
+        with self._jobs_lock:
+            pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        # cancel() สำเร็จเฉพาะงานที่ยังไม่ถูกส่งให้ process ลูก เขียนสถานะก่อนรองานที่รันอยู่
+        for job_id, future in list(self._futures.items()):
+            if future.cancel():
+                self._jobs.write(job_id, {
+                    'status': 'error', 'job_id': job_id,
+                    'message': 'Training job cancelled by worker restart, please resubmit'
+                })
+        pool.shutdown(wait=True)
+    
     # === VISUALIZATION ===
     def create_chart(self, data, chart_type='bar', x_col=None, y_col=None):
         """สร้างกราห์แบบ JSON response (ไม่ใช้ visualization libraries)"""
+        if not isinstance(data, SUPPORTED_INPUTS):
+            return self._unsupported_input(data)
         try:
-            df = pd.DataFrame(data) if isinstance(data, (dict, list)) else data
+            df = self._as_df(data)
             
             if chart_type == 'bar' and x_col and y_col:
-                chart_data = df.groupby(x_col)[y_col].sum().to_dict()
+                y = df[y_col]
+                # ชนิด numpy ล้วนเท่านั้น (nullable/extension dtype ใช้ groupby)
+                kind = y.dtype.kind if isinstance(y.dtype, np.dtype) else None
+                if kind in ('f', 'i', 'u', 'b'):
+                    # group-sum แบบ O(N) ด้วย factorize (ไม่ sort กลุ่ม, ข้าม NaN เหมือน groupby)
+                    codes, uniques = pd.factorize(df[x_col], sort=False)
+                    mask = codes >= 0
+                    if kind == 'f':
+                        weights = np.nan_to_num(y.to_numpy(dtype=np.float64)[mask])
+                        sums = np.bincount(codes[mask], weights=weights, minlength=len(uniques))
+                    else:
+                        # bincount รวมเป็น float64 ซึ่งเสียความแม่นยำเกิน 2**53 จึงรวมจำนวนเต็มด้วย accumulator จำนวนเต็ม
+                        sums = np.zeros(len(uniques), dtype=np.uint64 if kind == 'u' else np.int64)
+                        np.add.at(sums, codes[mask], y.to_numpy()[mask])
+                    chart_data = dict(zip(uniques.tolist(), sums.tolist()))
+                else:
+                    chart_data = df.groupby(x_col, sort=False)[y_col].sum().to_dict()
                 return {
                     'status': 'success',
                     'chart_type': 'bar',
@@ -123,7 +416,11 @@ class AnalyticsService:
                     'y_label': y_col
                 }
             elif chart_type == 'histogram' and x_col:
-                hist_data = df[x_col].value_counts().to_dict()
+                # factorize + bincount: นับแบบ O(N) โดยไม่สร้าง Series/Index กลาง
+                codes, uniques = pd.factorize(df[x_col], sort=False)
+                counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+                order = np.argsort(-counts, kind='stable')  # เรียงจากมากไปน้อยเหมือน value_counts
+                hist_data = dict(zip(uniques.take(order).tolist(), counts[order].tolist()))
                 return {
                     'status': 'success', 
                     'chart_type': 'histogram',
@@ -132,9 +429,10 @@ class AnalyticsService:
                 }
             else:
                 # Default: correlation matrix for numeric data
-                numeric_df = df.select_dtypes(include=[np.number])
-                if len(numeric_df.columns) > 1:
-                    corr_matrix = numeric_df.corr().round(3).to_dict()
+                numeric_cols = self._numeric_columns(df)
+                if len(numeric_cols) > 1:
+                    values = df[numeric_cols].to_numpy(dtype=np.float64)
+                    corr_matrix = self._correlation_matrix(values, numeric_cols, decimals=3)
                     return {
                         'status': 'success',
                         'chart_type': 'correlation_matrix',
@@ -142,83 +440,118 @@ class AnalyticsService:
                     }
                 else:
                     return {'status': 'error', 'message': 'Need numeric data for default chart'}
-        except Exception as e:
+        except DATA_ERRORS as e:
             return {'status': 'error', 'message': str(e)}
     
     # === DATA VALIDATION ===
     def validate_data(self, data):
         """ตรวจสอบคุณภาพข้อมูล"""
+        if not isinstance(data, SUPPORTED_INPUTS):
+            return self._unsupported_input(data)
         try:
-            df = pd.DataFrame(data) if isinstance(data, (dict, list)) else data
+            df = self._as_df(data)
             
             total_cells = df.size
-            missing_cells = df.isnull().sum().sum()
-            missing_percentage = (missing_cells / total_cells) * 100
+            missing_cells = int(df.isna().to_numpy().sum())
             
-            duplicates = df.duplicated().sum()
-            duplicate_percentage = (duplicates / len(df)) * 100
+            # เทียบค่าจริงของแถว (hash_pandas_object ชนกันได้ เช่น 1 กับ '1' ในคอลัมน์ object)
+            duplicates = int(df.duplicated().sum())
             
-            quality_score = 100 - missing_percentage - duplicate_percentage
+            # ข้อมูลว่าง: เปอร์เซ็นต์เป็น None (null) และ quality_score เป็น 0 แทนการหารด้วยศูนย์
+            missing_percentage = (missing_cells / total_cells) * 100 if total_cells else None
+            duplicate_percentage = (duplicates / len(df)) * 100 if len(df) else None
+            if missing_percentage is None or duplicate_percentage is None:
+                quality_score = 0
+            else:
+                quality_score = max(0, 100 - missing_percentage - duplicate_percentage)
             
             return {
                 'status': 'success',
                 'total_rows': len(df),
                 'total_columns': len(df.columns),
-                'missing_values': int(missing_cells),
-                'missing_percentage': float(missing_percentage),
-                'duplicates': int(duplicates),
-                'duplicate_percentage': float(duplicate_percentage),
-                'quality_score': max(0, float(quality_score))
+                'missing_values': missing_cells,
+                'missing_percentage': missing_percentage,
+                'duplicates': duplicates,
+                'duplicate_percentage': duplicate_percentage,
+                'quality_score': quality_score
             }
-        except Exception as e:
+        except DATA_ERRORS as e:
             return {'status': 'error', 'message': str(e)}
     
     # === METRICS TRACKING ===
     def track_request(self, endpoint, method, status_code, response_time):
         """Track API metrics"""
-        with self.lock:
-            key = f"{method}:{endpoint}"
-            metric = self.metrics[key]
+        key = f"{method}:{endpoint}"
+        shard = hash(key) & (METRIC_SHARDS - 1)
+        with self.locks[shard]:
+            metric = self.metric_shards[shard][key]
+            totals = self.shard_totals[shard]
             
-            metric['count'] += 1
-            metric['total_time'] += response_time
-            metric['last_access'] = datetime.now()
-            metric['response_times'].append(response_time)
+            metric.count += 1
+            metric.total_time += response_time
+            metric.last_access_ns = time.time_ns()
+            metric.rt_buf[metric.rt_head % RESPONSE_TIME_WINDOW] = response_time
+            metric.rt_head += 1
+            totals[0] += 1
             
             if status_code >= 400:
-                metric['errors'] += 1
+                metric.errors += 1
+                totals[1] += 1
     
     def get_metrics(self):
         """Get performance metrics"""
-        with self.lock:
-            result = {}
-            for key, metric in self.metrics.items():
-                avg_response_time = (
-                    metric['total_time'] / metric['count'] 
-                    if metric['count'] > 0 else 0
-                )
+        result = {}
+        for shard, lock in zip(self.metric_shards, self.locks):
+            # ถือ lock ครั้งเดียวต่อ shard แค่ตอน copy ค่า คำนวณ/format ข้างนอกเพื่อไม่ให้ track_request รอ
+            changed = []
+            with lock:
+                for key, metric in shard.items():
+                    # count เป็น version: ถ้าเท่ากับตอน cache แปลว่าไม่มี request ใหม่ ใช้ entry เดิมได้
+                    cached = self._metrics_cache.get(key)
+                    if cached is not None and cached[0] == metric.count:
+                        result[key] = cached[1]
+                        continue
+                    window = min(metric.rt_head, RESPONSE_TIME_WINDOW)
+                    changed.append((
+                        key, metric.count, metric.total_time, metric.errors,
+                        metric.last_access_ns, metric.rt_buf[:window].copy()
+                    ))
+            
+            for key, count, total_time, errors, last_access_ns, recent_times in changed:
+                avg_response_time = total_time / count if count > 0 else 0
+                
+                # p95 ของ window ล่าสุดด้วย np.partition (O(n)) แทนการ sort ทั้ง window
+                k = int(len(recent_times) * 0.95)
+                p95_response_time = float(np.partition(recent_times, k)[k]) if len(recent_times) else 0
                 
-                result[key] = {
-                    'total_requests': metric['count'],
-                    'total_errors': metric['errors'],
-                    'error_rate': metric['errors'] / metric['count'] if metric['count'] > 0 else 0,
+                result[key] = entry = {
+                    'total_requests': count,
+                    'total_errors': errors,
+                    'error_rate': errors / count if count > 0 else 0,
                     'avg_response_time_ms': round(avg_response_time * 1000, 2),
-                    'last_access': metric['last_access'].isoformat() if metric['last_access'] else None
+                    'p95_response_time_ms': round(p95_response_time * 1000, 2),
+                    # แปลงเป็น ISO string ตอนส่งออกเท่านั้น (ต่อ endpoint ไม่ใช่ต่อ request)
+                    'last_access': datetime.fromtimestamp(last_access_ns / 1e9).isoformat() if last_access_ns else None
                 }
-            
-            return result
+                self._metrics_cache[key] = (count, entry)
+        
+        return result
     
     def get_health_status(self):
         """Get service health"""
-        with self.lock:
-            total_requests = sum(m['count'] for m in self.metrics.values())
-            total_errors = sum(m['errors'] for m in self.metrics.values())
-            uptime = datetime.now() - self.start_time
-            
-            return {
-                'status': 'healthy',
-                'uptime_seconds': int(uptime.total_seconds()),
-                'total_requests': total_requests,
-                'total_errors': total_errors,
-                'error_rate': total_errors / total_requests if total_requests > 0 else 0
-            }
+        # O(METRIC_SHARDS) ไม่ขึ้นกับจำนวน endpoint
+        total_requests = 0
+        total_errors = 0
+        for lock, totals in zip(self.locks, self.shard_totals):
+            with lock:
+                total_requests += totals[0]
+                total_errors += totals[1]
+        uptime = datetime.now() - self.start_time
+        
+        return {
+            'status': 'healthy',
+            'uptime_seconds': int(uptime.total_seconds()),
+            'total_requests': total_requests,
+            'total_errors': total_errors,
+            'error_rate': total_errors / total_requests if total_requests > 0 else 0
+        }
@@ -0,0 +1,43 @@
+"""Gunicorn configuration for production deployment"""
+import multiprocessing
+import os
+
+# Server socket
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Worker processes - threaded workers so one slow request does not block the process.
+# Set WORKER_CLASS=gevent (requires gevent) for I/O-heavy deployments; gunicorn
+# applies the gevent monkey patching itself.
+workers = int(os.getenv('WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.getenv('WORKER_CLASS', 'gthread')
+threads = int(os.getenv('THREADS', 8))
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', 1000))  # gevent/eventlet only
+
+# Timeouts and connection handling
+timeout = 30
+keepalive = 65
+
+# Recycle workers periodically to bound memory growth
+max_requests = 1000
+max_requests_jitter = 100
+
+# Load the application once in the master; workers share it copy-on-write
+preload_app = True
+
+
+def when_ready(server):
+    """Build the analytics service (pandas/numpy) in the master before forking"""
+    from app import get_analytics
+    get_analytics()
+
+
+def post_fork(server, worker):
+    """Give each worker its own log listener (the master's thread does not survive fork)"""
+    from app import reset_logging_after_fork
+    reset_logging_after_fork()
+
+
+def worker_exit(server, worker):
+    """Cancel queued training jobs; running ones finish and store their results"""
+    from app import get_analytics
+    get_analytics().shutdown_training()
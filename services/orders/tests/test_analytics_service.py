@@ -0,0 +1,49 @@
+"""Regression tests for AnalyticsService edge cases"""
+import math
+
+import pytest
+
+from features.analytics_service import AnalyticsService
+
+
+@pytest.fixture
+def service():
+    return AnalyticsService()
+
+
+def test_analyze_single_row_has_nan_correlation(service):
+    result = service.analyze_data({'a': [1], 'b': [2]})
+
+    assert result['status'] == 'success'
+    assert math.isnan(result['correlation']['a']['b'])
+
+
+def test_default_chart_single_row_has_nan_correlation(service):
+    result = service.create_chart({'a': [1], 'b': [2]}, chart_type='none')
+
+    assert result['status'] == 'success'
+    assert math.isnan(result['data']['a']['b'])
+
+
+def test_analyze_zero_rows_has_nan_stats(service):
+    result = service.analyze_data({'a': [], 'b': []})
+
+    assert result['status'] == 'success'
+    assert all(math.isnan(value) for value in result['descriptive_stats']['a'].values())
+
+
+def test_validate_empty_frame(service):
+    result = service.validate_data({'a': []})
+
+    assert result['status'] == 'success'
+    assert result['missing_percentage'] is None
+    assert result['duplicate_percentage'] is None
+    assert result['quality_score'] == 0
+
+
+def test_bar_chart_integer_sums_are_exact(service):
+    data = {'x': ['a', 'a', 'b'], 'y': [2**53 + 1, 2, 5]}
+
+    result = service.create_chart(data, chart_type='bar', x_col='x', y_col='y')
+
+    assert result['data'] == {'a': 2**53 + 3, 'b': 5}
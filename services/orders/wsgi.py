@@ -1,8 +1,10 @@
 """WSGI entry point for production deployment"""
 
-from app import app
+from app import app, config
+from cache import HealthCache
 
-application = app
+# Serve /health from a short-lived cache so probes and scrapers skip the Flask stack
+application = HealthCache(app, path='/health', ttl=config.HEALTH_CACHE_TTL)
 
 if __name__ == "__main__":
-    application.run()
+    app.run()